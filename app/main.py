@@ -4,9 +4,10 @@ from streamlit_folium import st_folium
 from datetime import datetime
 import service
 import geopandas as gpd
-from shapely.geometry import Point
-from pyproj import Proj, transform
+import numpy as np
+import shapely
 import requests
+from requests.adapters import HTTPAdapter
 import plotly.graph_objects as go
 import os
 
@@ -82,54 +83,69 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Helper functions
-def get_coordinates(destination):
-    """Get coordinates from location name using Nominatim"""
+# Shared session so Nominatim connections are kept alive and pooled across lookups
+NOMINATIM_TIMEOUT = 3  # seconds
+NOMINATIM_SESSION = requests.Session()
+NOMINATIM_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+NOMINATIM_SESSION.headers.update({"User-Agent": "nyc-crime-app"})  # required by Nominatim's usage policy
+
+@st.cache_data(ttl=86400)
+def fetch_coordinates(destination):
+    """Query Nominatim for a location name; errors propagate so they aren't cached"""
     base_url = "https://nominatim.openstreetmap.org/search"
     params = {
         "q": destination,
         "format": "json",
         "limit": 1,
     }
+    response = NOMINATIM_SESSION.get(base_url, params=params, timeout=NOMINATIM_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    if data:
+        return float(data[0]["lat"]), float(data[0]["lon"])
+    return None
+
+def get_coordinates(destination):
+    """Get coordinates from location name using Nominatim"""
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        if data:
-            return float(data[0]["lat"]), float(data[0]["lon"])
+        return fetch_coordinates(destination)
     except:
         pass
     return None
 
-def lon_lat_to_utm(lon, lat):
-    """Convert lon/lat to UTM coordinates"""
-    utm_proj = Proj(init="epsg:2263")
-    utm_x, utm_y = transform(Proj(init="epsg:4326"), utm_proj, lon, lat)
-    return utm_x, utm_y
+@st.cache_resource
+def load_shapes():
+    """Load precinct and borough shapefiles once per process"""
+    shapefile = os.path.join(SCRIPT_DIR, 'shapes', 'geo_export_84578745-538d-401a-9cb5-34022c705879.shp')
+    borough_sh = os.path.join(SCRIPT_DIR, 'borough', 'nybb.shp')
+    precinct_gdf = gpd.read_file(shapefile)
+    # Reproject boroughs to lon/lat so both lookups share the clicked point
+    borough_gdf = gpd.read_file(borough_sh).to_crs(epsg=4326)
+    
+    # Build the spatial indexes and prepare the polygons up front
+    # so the first click doesn't pay for it
+    for gdf in (precinct_gdf, borough_gdf):
+        gdf.sindex
+        shapely.prepare(np.asarray(gdf.geometry))
+    
+    return precinct_gdf, borough_gdf
+
+def find_containing(gdf, column, point):
+    """Return `column` of the first polygon in gdf containing point"""
+    # Bounding-box candidates from the spatial index, then an exact
+    # test against the prepared polygons
+    candidates = gdf.sindex.query(point)
+    hits = candidates[shapely.contains(gdf.geometry.values[candidates], point)]
+    return gdf.iloc[hits[0]][column] if len(hits) else None
 
 def get_precinct_and_borough(lat, lon):
     """Get precinct and borough from coordinates"""
     try:
-        shapefile = os.path.join(SCRIPT_DIR, 'shapes', 'geo_export_84578745-538d-401a-9cb5-34022c705879.shp')
-        borough_sh = os.path.join(SCRIPT_DIR, 'borough', 'nybb.shp')
-        
-        precinct_gdf = gpd.read_file(shapefile)
-        borough_gdf = gpd.read_file(borough_sh)
-        
-        point = Point(lon, lat)
-        point2 = Point(lon_lat_to_utm(lon, lat))
-        
-        precinct = None
-        borough = None
-        
-        for _, row in precinct_gdf.iterrows():
-            if row['geometry'].contains(point):
-                precinct = row['precinct']
-                break
+        precinct_gdf, borough_gdf = load_shapes()
         
-        for _, row in borough_gdf.iterrows():
-            if row['geometry'].contains(point2):
-                borough = row['BoroName']
-                break
+        point = shapely.points(lon, lat)
+        precinct = find_containing(precinct_gdf, 'precinct', point)
+        borough = find_containing(borough_gdf, 'BoroName', point)
         
         return precinct, borough
     except Exception as e:
@@ -148,6 +164,13 @@ def generate_base_map(default_location=[40.704467, -73.892246], default_zoom_sta
     )
     return base_map
 
+@st.cache_resource
+def build_click_map():
+    """Build the clickable base map once and reuse it across reruns"""
+    base_map = generate_base_map()
+    base_map.add_child(folium.LatLngPopup())
+    return base_map
+
 # Sidebar
 with st.sidebar:
     st.image("https://upload.wikimedia.org/wikipedia/commons/thumb/4/48/New_York_City_Skyline_Illustration.jpg/800px-New_York_City_Skyline_Illustration.jpg", 
@@ -202,11 +225,9 @@ st.info("👆 Click anywhere on the map to choose your destination in NYC")
 if 'selected_location' not in st.session_state:
     st.session_state.selected_location = None
 
-# Render map
-base_map = generate_base_map()
-base_map.add_child(folium.LatLngPopup())
-
-map_data = st_folium(base_map, height=450, width=None, key="main_map")
+# Render map (only clicks trigger a rerun, not panning or zooming)
+map_data = st_folium(build_click_map(), height=450, width=None, key="main_map",
+                     returned_objects=["last_clicked"])
 
 # Handle map clicks
 if map_data and map_data.get('last_clicked'):
@@ -291,11 +312,8 @@ if st.session_state.selected_location:
                     borough=loc['borough']
                 )
                 
-                # Get prediction
-                pred_category, crime_types = service.predict(X)
-                
-                # Get probabilities if available
-                probabilities = service.get_prediction_probability(X)
+                # Get prediction and probabilities if available
+                pred_category, crime_types, probabilities = service.predict_all(X)
                 
                 st.markdown("---")
                 st.subheader("📊 Prediction Results")
@@ -1,233 +1,245 @@
 import joblib
-import pandas as pd
+import logging
 import numpy as np
+from bisect import bisect_right
 import os
+import streamlit as st
+
+# Optional: compiled XGBoost predictor (see README, "Compiled model")
+try:
+    import tl2cgen
+except ImportError:
+    tl2cgen = None
 
 # Get the directory where this script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_DIR = os.path.join(SCRIPT_DIR, "model")
+MODEL_PATH = os.path.join(MODEL_DIR, "xgboost_model.pkl")
+COMPILED_MODEL_PATH = os.path.join(MODEL_DIR, "xgboost_model.so")
+
+logger = logging.getLogger(__name__)
+
+# Final feature vector order expected by the scaler and model
+FEATURE_COLS = ('year', 'month', 'day', 'hour', 'Latitude', 'Longitude',
+                'ADDR_PCT_CD', 'JURISDICTION_CODE',
+                'weekday_encoded', 'COMPLETED_encoded', 'CRIME_CLASS_encoded',
+                'BORO_NM_encoded', 'PREM_TYP_DESC_encoded', 'OCCURENCE_encoded',
+                'SUSP_AGE_GROUP_encoded', 'SUSP_RACE_encoded', 'SUSP_SEX_encoded',
+                'VIC_AGE_GROUP_encoded', 'VIC_RACE_encoded', 'VIC_SEX_encoded',
+                'season_encoded', 'is_weekend', 'is_night', 'is_rush_hour',
+                'location_crime_density')
+
+# Place type -> (PREM_TYP_DESC, OCCURENCE); anything else is treated as street
+PLACE_MAP = {
+    "In park": ("PARK/PLAYGROUND", "INSIDE"),
+    "In public housing": ("RESIDENCE - PUBLIC HOUSING", "INSIDE"),
+    "In station": ("TRANSIT - NYC SUBWAY", "INSIDE"),
+}
+DEFAULT_PLACE = ("STREET", "FRONT OF")
+
+# Lower bounds of each victim age group after the first
+AGE_BINS = (18, 25, 45, 65)
+AGE_GROUPS = ("<18", "18-24", "25-44", "45-64", "65+")
+
+# Weekday names indexed by date.weekday(), matching the weekday encoder classes
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# (is_night, is_rush_hour) for each hour of the day
+HOUR_FLAGS = tuple(
+    (1 if (h >= 20 or h <= 6) else 0, 1 if h in (7, 8, 9, 17, 18, 19) else 0)
+    for h in range(24)
+)
+
+# Season for each month, indexed by month - 1
+MONTH_SEASONS = ('Winter', 'Winter', 'Spring', 'Spring', 'Spring', 'Summer',
+                 'Summer', 'Summer', 'Fall', 'Fall', 'Fall', 'Winter')
+
+# Specific crime types for each predicted crime category
+CRIME_DETAILS = {
+    'DRUGS/ALCOHOL': (
+        'DANGEROUS DRUGS', 
+        'INTOXICATED & IMPAIRED DRIVING',
+        'ALCOHOLIC BEVERAGE CONTROL LAW', 
+        'UNDER THE INFLUENCE OF DRUGS', 
+        'LOITERING FOR DRUG PURPOSES'
+    ),
+    'PROPERTY': (
+        'BURGLARY', 
+        'PETIT LARCENY', 
+        'GRAND LARCENY', 
+        'ROBBERY', 
+        'THEFT-FRAUD', 
+        'GRAND LARCENY OF MOTOR VEHICLE', 
+        'FORGERY', 
+        'ARSON',
+        'POSSESSION OF STOLEN PROPERTY',
+        'CRIMINAL MISCHIEF & RELATED OF'
+    ),
+    'PERSONAL': (
+        'ASSAULT 3 & RELATED OFFENSES', 
+        'FELONY ASSAULT',
+        'OFFENSES AGAINST THE PERSON', 
+        'HOMICIDE-NEGLIGENT,UNCLASSIFIE',
+        'KIDNAPPING & RELATED OFFENSES',
+        'DANGEROUS WEAPONS'
+    ),
+    'SEXUAL': (
+        'SEX CRIMES', 
+        'HARRASSMENT 2', 
+        'RAPE', 
+        'PROSTITUTION & RELATED OFFENSES',
+        'FELONY SEX CRIMES'
+    )
+}
+
+@st.cache_resource
+def load_artifacts():
+    """
+    Load XGBoost model and preprocessing artifacts once per process
+    """
+    model = joblib.load(MODEL_PATH)
+    scaler = joblib.load(os.path.join(MODEL_DIR, "scaler.pkl"))
+    label_encoders = joblib.load(os.path.join(MODEL_DIR, "label_encoders.pkl"))
+    return model, scaler, label_encoders
+
+@st.cache_resource
+def load_compiled_model():
+    """
+    Load the compiled XGBoost predictor if it has been built,
+    otherwise return None so the pickled model is used
+    """
+    if tl2cgen is None or not os.path.exists(COMPILED_MODEL_PATH):
+        return None
+    
+    # A library older than the pickled model was built from a previous training run
+    if os.path.getmtime(COMPILED_MODEL_PATH) < os.path.getmtime(MODEL_PATH):
+        logger.warning("Ignoring %s: it is older than %s, rebuild it after retraining",
+                       COMPILED_MODEL_PATH, MODEL_PATH)
+        return None
+    
+    try:
+        return tl2cgen.Predictor(COMPILED_MODEL_PATH)
+    except Exception as e:
+        # Built for another machine, wrong ABI or corrupt: fall back to the pickled model
+        logger.warning("Could not load compiled model %s, using the pickled model: %s",
+                       COMPILED_MODEL_PATH, e)
+        return None
 
-# Load XGBoost model and preprocessing artifacts
-model = joblib.load(os.path.join(MODEL_DIR, "xgboost_model.pkl"))
-scaler = joblib.load(os.path.join(MODEL_DIR, "scaler.pkl"))
-label_encoders = joblib.load(os.path.join(MODEL_DIR, "label_encoders.pkl"))
+@st.cache_resource
+def load_encoder_maps():
+    """
+    Build plain dict lookups from the label encoders so encoding
+    a value is a single dict access instead of an encoder call
+    """
+    _, _, label_encoders = load_artifacts()
+    encoder_maps = {
+        col: {str(cls): i for i, cls in enumerate(encoder.classes_)}
+        for col, encoder in label_encoders.items()
+    }
+    crime_categories = list(label_encoders['CRIME_CATEGORY'].classes_)
+    return encoder_maps, crime_categories
+
+@st.cache_resource
+def load_scaler_params():
+    """
+    Pull the StandardScaler's mean and scale out as float64 arrays so a row
+    can be scaled directly, without sklearn's per-call input validation
+    """
+    _, scaler, _ = load_artifacts()
+    n_features = len(FEATURE_COLS)
+    # transform only centers/scales when the flags are set, even if mean_ is fitted
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+    return mean.astype(np.float64), scale.astype(np.float64)
 
 def create_df(date, hour, latitude, longitude, place, age, race, gender, precinct, borough):
     """
-    Create a DataFrame with all features needed for prediction
+    Create the scaled feature row needed for prediction
     based on your model's feature engineering
     """
+    encoder_maps, _ = load_encoder_maps()
+    scaler_mean, scaler_scale = load_scaler_params()
     
     # Extract date components
-    year = date.year
     month = date.month
-    day = date.day
     hour = int(hour) if int(hour) < 24 else 0
-    
-    # Map weekday
-    weekday = date.strftime('%A')  # e.g., 'Monday', 'Tuesday', etc.
-    
-    # Basic location features
-    ADDR_PCT_CD = float(precinct) if precinct else 0.0
-    JURISDICTION_CODE = 0  # Default to NYPD
-    
-    # Map borough
-    boro = borough.upper() if borough else 'UNKNOWN'
+    weekday_idx = date.weekday()
     
     # Map place to premise type
-    if place == "In park":
-        PREM_TYP_DESC = "PARK/PLAYGROUND"
-        OCCURENCE = "INSIDE"
-    elif place == "In public housing":
-        PREM_TYP_DESC = "RESIDENCE - PUBLIC HOUSING"
-        OCCURENCE = "INSIDE"
-    elif place == "In station":
-        PREM_TYP_DESC = "TRANSIT - NYC SUBWAY"
-        OCCURENCE = "INSIDE"
-    else:
-        PREM_TYP_DESC = "STREET"
-        OCCURENCE = "FRONT OF"
-    
-    # Determine age group
-    if age < 18:
-        VIC_AGE_GROUP = "<18"
-    elif 18 <= age <= 24:
-        VIC_AGE_GROUP = "18-24"
-    elif 25 <= age <= 44:
-        VIC_AGE_GROUP = "25-44"
-    elif 45 <= age <= 64:
-        VIC_AGE_GROUP = "45-64"
-    else:
-        VIC_AGE_GROUP = "65+"
-    
-    # Map gender
-    VIC_SEX = 'M' if gender == "Male" else 'F'
-    
-    # Map race
-    VIC_RACE = race.upper()
+    PREM_TYP_DESC, OCCURENCE = PLACE_MAP.get(place, DEFAULT_PLACE)
     
     # Additional features from your feature engineering
-    is_weekend = 1 if weekday in ['Saturday', 'Sunday'] else 0
-    is_night = 1 if (hour >= 20 or hour <= 6) else 0
-    is_rush_hour = 1 if hour in [7, 8, 9, 17, 18, 19] else 0
-    
-    # Season
-    if month in [12, 1, 2]:
-        season = 'Winter'
-    elif month in [3, 4, 5]:
-        season = 'Spring'
-    elif month in [6, 7, 8]:
-        season = 'Summer'
-    else:
-        season = 'Fall'
-    
-    # Default values for other required features
-    COMPLETED = "COMPLETED"
-    CRIME_CLASS = "FELONY"  # Default
-    JURIS_DESC = "N.Y. POLICE DEPT"
-    SUSP_AGE_GROUP = "UNKNOWN"
-    SUSP_RACE = "UNKNOWN"
-    SUSP_SEX = "(null)"
-    
-    # Location crime density (simplified - you'd calculate this from historical data)
-    location_crime_density = 100  # Placeholder value
-    
-    # Create initial DataFrame with categorical values
-    data_dict = {
-        'year': year,
-        'month': month,
-        'day': day,
-        'hour': hour,
-        'Latitude': latitude,
-        'Longitude': longitude,
-        'ADDR_PCT_CD': ADDR_PCT_CD,
-        'JURISDICTION_CODE': JURISDICTION_CODE,
-        'weekday': weekday,
-        'COMPLETED': COMPLETED,
-        'CRIME_CLASS': CRIME_CLASS,
-        'BORO_NM': boro,
-        'PREM_TYP_DESC': PREM_TYP_DESC,
-        'OCCURENCE': OCCURENCE,
-        'SUSP_AGE_GROUP': SUSP_AGE_GROUP,
-        'SUSP_RACE': SUSP_RACE,
-        'SUSP_SEX': SUSP_SEX,
-        'VIC_AGE_GROUP': VIC_AGE_GROUP,
-        'VIC_RACE': VIC_RACE,
-        'VIC_SEX': VIC_SEX,
-        'season': season,
-        'is_weekend': is_weekend,
-        'is_night': is_night,
-        'is_rush_hour': is_rush_hour,
-        'location_crime_density': location_crime_density
-    }
-    
-    # Encode categorical variables using your saved label encoders
-    encoded_features = {}
-    categorical_cols = ['weekday', 'COMPLETED', 'CRIME_CLASS', 'BORO_NM', 
-                       'PREM_TYP_DESC', 'OCCURENCE', 'JURIS_DESC',
-                       'SUSP_AGE_GROUP', 'SUSP_RACE', 'SUSP_SEX',
-                       'VIC_AGE_GROUP', 'VIC_RACE', 'VIC_SEX', 'season']
-    
-    for col in categorical_cols:
-        if col in data_dict:
-            try:
-                # Transform using saved encoder
-                encoded_value = label_encoders[col].transform([str(data_dict[col])])[0]
-                encoded_features[col + '_encoded'] = encoded_value
-            except:
-                # If value not in encoder, use 0
-                encoded_features[col + '_encoded'] = 0
-    
-    # Create final feature vector in the correct order
-    feature_cols = ['year', 'month', 'day', 'hour', 'Latitude', 'Longitude',
-                    'ADDR_PCT_CD', 'JURISDICTION_CODE',
-                    'weekday_encoded', 'COMPLETED_encoded', 'CRIME_CLASS_encoded',
-                    'BORO_NM_encoded', 'PREM_TYP_DESC_encoded', 'OCCURENCE_encoded',
-                    'SUSP_AGE_GROUP_encoded', 'SUSP_RACE_encoded', 'SUSP_SEX_encoded',
-                    'VIC_AGE_GROUP_encoded', 'VIC_RACE_encoded', 'VIC_SEX_encoded',
-                    'season_encoded', 'is_weekend', 'is_night', 'is_rush_hour',
-                    'location_crime_density']
-    
-    # Build final row
-    final_data = []
-    for col in feature_cols:
-        if col in data_dict:
-            final_data.append(data_dict[col])
-        elif col in encoded_features:
-            final_data.append(encoded_features[col])
-        else:
-            final_data.append(0)  # Default value
-    
-    # Create DataFrame
-    df = pd.DataFrame([final_data], columns=feature_cols)
-    
-    # Scale features
-    df_scaled = scaler.transform(df)
-    
-    return df_scaled
+    is_night, is_rush_hour = HOUR_FLAGS[hour]
+    
+    # Build the features in FEATURE_COLS order.
+    # Categorical values are label encoded (0 if not in the encoder);
+    # the fixed ones are the defaults for features the user doesn't provide.
+    features = (
+        date.year,
+        month,
+        date.day,
+        hour,
+        latitude,
+        longitude,
+        float(precinct) if precinct else 0.0,  # ADDR_PCT_CD
+        0,  # JURISDICTION_CODE, default to NYPD
+        encoder_maps['weekday'].get(WEEKDAYS[weekday_idx], 0),
+        encoder_maps['COMPLETED'].get("COMPLETED", 0),
+        encoder_maps['CRIME_CLASS'].get("FELONY", 0),
+        encoder_maps['BORO_NM'].get(borough.upper() if borough else 'UNKNOWN', 0),
+        encoder_maps['PREM_TYP_DESC'].get(PREM_TYP_DESC, 0),
+        encoder_maps['OCCURENCE'].get(OCCURENCE, 0),
+        encoder_maps['SUSP_AGE_GROUP'].get("UNKNOWN", 0),
+        encoder_maps['SUSP_RACE'].get("UNKNOWN", 0),
+        encoder_maps['SUSP_SEX'].get("(null)", 0),
+        encoder_maps['VIC_AGE_GROUP'].get(AGE_GROUPS[bisect_right(AGE_BINS, age)], 0),
+        encoder_maps['VIC_RACE'].get(race.upper(), 0),
+        encoder_maps['VIC_SEX'].get('M' if gender == "Male" else 'F', 0),
+        encoder_maps['season'].get(MONTH_SEASONS[month - 1], 0),
+        1 if weekday_idx >= 5 else 0,  # is_weekend
+        is_night,
+        is_rush_hour,
+        100,  # location_crime_density placeholder
+    )
+    assert len(features) == len(FEATURE_COLS)
+    
+    # Scale features in place in float64 (same as scaler.transform);
+    # only the scaled values are narrowed to float32 for the model
+    row = np.array(features, dtype=np.float64).reshape(1, -1)
+    np.subtract(row, scaler_mean, out=row)
+    np.divide(row, scaler_scale, out=row)
+    
+    return row.astype(np.float32)
 
-def predict(data):
+def predict_all(data):
     """
-    Make prediction and return crime category
+    Make prediction in a single model pass and return the crime category,
+    its specific crimes and the probabilities for all crime categories
     """
-    # Get prediction (encoded value)
-    pred_encoded = model.predict(data)[0]
+    model, _, _ = load_artifacts()
+    compiled_model = load_compiled_model()
+    _, crime_categories = load_encoder_maps()
+    
+    # Get prediction (encoded value) from the probabilities when available
+    # so the model only runs once, preferring the compiled predictor
+    if compiled_model is not None:
+        probabilities = compiled_model.predict(tl2cgen.DMatrix(data)).reshape(-1)
+    elif hasattr(model, 'predict_proba'):
+        probabilities = model.predict_proba(data)[0]
+    else:
+        probabilities = None
     
-    # Decode prediction to get actual crime category
-    crime_category = label_encoders['CRIME_CATEGORY'].inverse_transform([pred_encoded])[0]
+    if probabilities is not None:
+        pred_encoded = probabilities.argmax()
+        prob_dict = dict(zip(crime_categories, probabilities))
+    else:
+        pred_encoded = model.predict(data)[0]
+        prob_dict = None
     
-    # Map to specific crime types
-    crime_details = {
-        'DRUGS/ALCOHOL': [
-            'DANGEROUS DRUGS', 
-            'INTOXICATED & IMPAIRED DRIVING',
-            'ALCOHOLIC BEVERAGE CONTROL LAW', 
-            'UNDER THE INFLUENCE OF DRUGS', 
-            'LOITERING FOR DRUG PURPOSES'
-        ],
-        'PROPERTY': [
-            'BURGLARY', 
-            'PETIT LARCENY', 
-            'GRAND LARCENY', 
-            'ROBBERY', 
-            'THEFT-FRAUD', 
-            'GRAND LARCENY OF MOTOR VEHICLE', 
-            'FORGERY', 
-            'ARSON',
-            'POSSESSION OF STOLEN PROPERTY',
-            'CRIMINAL MISCHIEF & RELATED OF'
-        ],
-        'PERSONAL': [
-            'ASSAULT 3 & RELATED OFFENSES', 
-            'FELONY ASSAULT',
-            'OFFENSES AGAINST THE PERSON', 
-            'HOMICIDE-NEGLIGENT,UNCLASSIFIE',
-            'KIDNAPPING & RELATED OFFENSES',
-            'DANGEROUS WEAPONS'
-        ],
-        'SEXUAL': [
-            'SEX CRIMES', 
-            'HARRASSMENT 2', 
-            'RAPE', 
-            'PROSTITUTION & RELATED OFFENSES',
-            'FELONY SEX CRIMES'
-        ]
-    }
+    # Decode prediction to get actual crime category
+    crime_category = crime_categories[int(pred_encoded)]
     
-    # Return crime category and specific crimes
-    crimes = crime_details.get(crime_category, ['UNKNOWN CRIME TYPE'])
+    # Return crime category, specific crimes and probabilities
+    crimes = CRIME_DETAILS.get(crime_category, ('UNKNOWN CRIME TYPE',))
     
-    return crime_category, crimes
-
-def get_prediction_probability(data):
-    """
-    Get prediction probabilities for all crime categories
-    """
-    if hasattr(model, 'predict_proba'):
-        probabilities = model.predict_proba(data)[0]
-        crime_categories = label_encoders['CRIME_CATEGORY'].classes_
-        
-        # Create dictionary of probabilities
-        prob_dict = {category: prob for category, prob in zip(crime_categories, probabilities)}
-        return prob_dict
-    return None
\ No newline at end of file
+    return crime_category, crimes, prob_dict